@@ -4,6 +4,13 @@ from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 import plotly.express as px
 import numpy as np
+import pyarrow as pa
+import itertools
+import hashlib
+import html
+import re
+import os
+from pathlib import Path
 from datetime import datetime, timedelta
 
 # --- SECURITY CONSTANT ---
@@ -11,24 +18,181 @@ from datetime import datetime, timedelta
 PASSWORD = st.secrets["APP_PASSWORD"]
 # Key to track login status in session state
 LOGIN_STATUS_KEY = "is_logged_in"
+# Rows of the raw data preview sent to the browser by default
+RAW_PREVIEW_ROWS = 200
 
 # ---------------------------------------------------------
-# GOOGLE SHEET AUTH (Placeholder for deployment)
+# STYLE CONSTANTS (charts and matrix CSS)
 # ---------------------------------------------------------
-try:
-    scope = ["https://www.googleapis.com/auth/spreadsheets",
-             "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(
-        st.secrets["google"],
-        scope
+# Item weight pie (legend to the right of the pie)
+ITEM_PIE_LAYOUT = dict(
+    height=700, 
+    width=500, # Enforce a specific width for better consistency
+    title_x=0.05, # Align title to left to make space for pie
+    uniformtext_minsize=12,
+    uniformtext_mode='hide',
+    # Legend placement to the right of the pie (0.75-1.0)
+    legend=dict(
+        orientation="v", 
+        yanchor="top",
+        y=1.0, 
+        xanchor="left",
+        x=0.75, 
+        font=dict(size=9)
+    )
+)
+
+# Purity pie (legend below the chart)
+PURITY_PIE_LAYOUT = dict(
+    height=700, 
+    width=500, # Enforce a specific width for better consistency
+    title_x=0.5, 
+    uniformtext_minsize=12, 
+    uniformtext_mode='hide',
+    # Legend horizontal, below the chart
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=-0.05, 
+        xanchor="center",
+        x=0.5
     )
-    client = gspread.authorize(creds)
-except (KeyError, FileNotFoundError, AttributeError):
-    client = None
+)
+
+LEAD_TIME_COLORS = {
+    'Avg Lead Time': '#6a9ce7',
+    'Max Lead Time': '#d9534f',
+    'Min Lead Time': '#5cb85c',
+}
+
+MATRIX_CSS = """
+    <style>
+    /* General styling for the matrix container */
+    .matrix-container {
+        border: 1px solid #333333;
+        border-radius: 8px;
+        margin-bottom: 20px;
+        overflow: hidden; 
+    }
+    .matrix-table {
+        width: 100%;
+        border-collapse: collapse;
+        margin: 0;
+    }
+
+    /* Styling for the header row */
+    .matrix-header {
+        background-color: #383838; 
+        padding: 8px 5px; 
+        font-weight: 700;
+        color: #f0f2f6; 
+        border-bottom: 2px solid #555555;
+        text-transform: uppercase;
+        font-size: 0.75em; 
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+        text-align: center; 
+    }
+    .matrix-header.person-header {
+          text-align: left; 
+    }
+
+    /* Styling for the data rows (Person Summary) */
+    .person-summary-row td {
+        padding: 2px 5px; 
+        border: none;
+        border-bottom: 1px solid #222222; 
+        vertical-align: middle;
+        font-size: 0.8em; 
+        height: 25px; 
+    }
+
+    /* INCREASE FONT SIZE FOR VALUE COLUMNS */
+    .person-summary-row td.summary-value-cell {
+        font-size: 1.1em; 
+        text-align: right;
+        height: 35px; 
+        padding-top: 5px; 
+        padding-bottom: 5px;
+    }
+
+    /* Grand Total Row Styling */
+    .grand-total-row td {
+        background-color: #1e1e1e; 
+        font-weight: 800;
+        color: #ffffff; 
+        border-top: 2px solid #555555;
+        font-size: 0.85em;
+    }
+
+    /* Color Coding for Metric Values */
+    .on-time-del { color: #5cb85c; font-weight: 600; }
+    .late-del { color: #d9534f; font-weight: 600; }
+    .ord-wt { color: #6a9ce7; }
+    .pending-ord { color: #f0ad4e; font-weight: 600; }
+    .late-del-percent { color: #fa5788; font-weight: 600; }
+
+    /* Layout */
+    .stColumns { margin-top: 0px !important; margin-bottom: 0px !important; padding-top: 0px !important; padding-bottom: 0px !important; position: relative; }
+    .person-name-cell { padding-left: 5px !important; }
+    </style>
+"""
+
+# ---------------------------------------------------------
+# GOOGLE SHEET AUTH (Placeholder for deployment)
+# ---------------------------------------------------------
+@st.cache_resource # Authorize once per server process, not on every rerun
+def get_client():
+    """Returns an authorized gspread client, or None if credentials are missing."""
+    try:
+        scope = ["https://www.googleapis.com/auth/spreadsheets",
+                 "https://www.googleapis.com/auth/drive"]
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(
+            st.secrets["google"],
+            scope
+        )
+        return gspread.authorize(creds)
+    except (KeyError, FileNotFoundError, AttributeError):
+        return None
+
+
+@st.cache_resource # Reuse the worksheet handle across reruns and sessions
+def get_worksheet():
+    """Opens the ORDER_SHEET worksheet of the production report spreadsheet."""
+    return get_client().open("PRODUCTION_ORDER_STATUS_REPORT").worksheet("ORDER_SHEET")
+
 
 # ---------------------------------------------------------
 # LOAD SHEET AND DATA CLEANING
 # ---------------------------------------------------------
+# Cleaned frames persisted across processes, one Feather file per sheet revision. The order
+# data is private to this password-protected app, so it lives in a user-only (0700) directory.
+DISK_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "order_dashboard"
+DISK_CACHE_MAX_FILES = 3 # Least recently used revisions beyond this are deleted
+# Part of the cache key: bump it whenever load_data's output changes (columns, dtypes, row
+# order), so files written by older code are never read back
+DISK_CACHE_VERSION = 1
+
+
+def clear_disk_cache():
+    """Deletes every cached Feather file so the next load refetches the sheet (best effort)."""
+    try:
+        for cached in DISK_CACHE_DIR.glob("*.feather"):
+            cached.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+# Everything except digits, '.' and '-' is dropped before parsing numeric text (compiled once)
+NUMERIC_TEXT_JUNK = re.compile(r'[^\d\.\-]')
+
+
+def parse_numeric_text(cells):
+    """Parses numeric text cells such as "1,200 kg" into a float array (NaN if unparseable)."""
+    # Strip everything but digits, '.' and '-' and let pandas parse the rest
+    cleaned = pd.Series(cells, dtype=object).str.replace(NUMERIC_TEXT_JUNK, '', regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").to_numpy(np.float64)
+
 @st.cache_data(ttl=600) # Cache data for 10 minutes to reduce API calls
 def load_data():
     """Loads and cleans data from Google Sheet."""
@@ -36,8 +200,15 @@ def load_data():
     # Define expected columns for cleaning/checks
     EXPECTED_DATE_COLS = ["ODR DATE", "DUE DATE"]
     EXPECTED_NUMERIC_COLS = ["ORD WT", "ON_TIME DEL", "LATE_DEL"]
+    # Only these columns are fetched from the sheet; the rest never leave Google
+    SHEET_COLS = ["CONT.PERSON", "LATE DELIVERY REASON", "ORD NO", "ITEM NAME", "PURITY",
+                  *EXPECTED_NUMERIC_COLS, *EXPECTED_DATE_COLS]
+    # Disk cache file for the current sheet revision when the data came from Google
+    cache_path = None
+    # Identifies the frame's contents; stored in df.attrs["revision"] for the filter cache
+    revision = "dummy-data"
     
-    if client is None:
+    if get_client() is None:
         # Fallback to dummy data structure if creds are missing for demonstration
         df_data = {
             "CONT.PERSON": ["John", "Jane", "John", "Alice", "Jane", "Alice", "John", "Jane", "Bob", "Alice"],
@@ -55,9 +226,49 @@ def load_data():
         st.info("Using dummy data. Real-time data loading requires 'st.secrets[\"google\"]'.")
     else:
         try:
-            sheet = client.open("PRODUCTION_ORDER_STATUS_REPORT").worksheet("ORDER_SHEET")
-            raw = sheet.get_all_values()
-            df = pd.DataFrame(raw)
+            sheet = get_worksheet()
+            # Warm start: a Drive metadata call is much cheaper than re-reading and re-parsing the
+            # sheet. Its modifiedTime changes on every edit, so it identifies the revision.
+            # It runs first so a cache hit makes no Sheets API call at all.
+            revision = sheet.spreadsheet.get_lastUpdateTime()
+            cache_key = hashlib.sha1(
+                f"{DISK_CACHE_VERSION}:{sheet.spreadsheet.id}:{sheet.id}:{revision}".encode()
+            ).hexdigest()
+            cache_path = DISK_CACHE_DIR / f"{cache_key}.feather"
+            if cache_path.exists():
+                try:
+                    df = pd.read_feather(cache_path)
+                    os.utime(cache_path) # Mark as recently used for the eviction sweep
+                    df.attrs["revision"] = revision
+                    return df
+                except (OSError, pa.ArrowException):
+                    pass # Unreadable cache file: fall through and fetch from the sheet
+            
+            # Assuming 2nd row is the actual header; map the needed names to column positions.
+            # This is the only header cleanup: names are stripped, blank/unused headers are
+            # skipped and duplicates keep their first occurrence, all in one pass.
+            col_positions = {}
+            for i, name in enumerate(sheet.row_values(2), start=1):
+                name = name.strip()
+                if name in SHEET_COLS and name not in col_positions:
+                    col_positions[name] = i
+            
+            # One batchGet for just those columns (data starts on row 3), with numbers unformatted
+            # and dates as serial numbers, so neither needs string parsing
+            ranges = []
+            for i in col_positions.values():
+                start = gspread.utils.rowcol_to_a1(3, i)
+                ranges.append(f"'{sheet.title}'!{start}:{start[:-1]}")
+            resp = {}
+            if ranges:
+                resp = sheet.spreadsheet.values_batch_get(
+                    ranges,
+                    params={
+                        "majorDimension": "COLUMNS",
+                        "valueRenderOption": "UNFORMATTED_VALUE",
+                        "dateTimeRenderOption": "SERIAL_NUMBER",
+                    },
+                )
         except gspread.exceptions.SpreadsheetNotFound:
             st.error("Spreadsheet 'PRODUCTION_ORDER_STATUS_REPORT' not found. Check the name.")
             return pd.DataFrame()
@@ -68,49 +279,106 @@ def load_data():
             st.error(f"An error occurred while loading data: {e}")
             return pd.DataFrame()
 
-        # ----- CLEAN HEADER and Data -----
-        if df.empty or df.shape[0] < 2:
-            st.warning("Dataframe is empty or has too few rows to determine the header.")
+        # ----- BUILD DATAFRAME FROM COLUMNS -----
+        # The API trims trailing blank cells, so pad every column to the same length
+        columns = [(vr.get("values") or [[]])[0] for vr in resp.get("valueRanges", [])]
+        n_rows = max((len(values) for values in columns), default=0)
+        if n_rows == 0:
+            st.warning("No matching header columns or data rows were found in the sheet.")
             return pd.DataFrame()
             
-        df = df.dropna(axis=1, how="all")
-        # Assuming 2nd row (index 1) is the actual header
-        df.columns = df.iloc[1]
-        df = df[2:].reset_index(drop=True)
-
-    # 1. Deduplicate and strip whitespace from column names (CRITICAL FIX)
-    df.columns = df.columns.astype(str).str.strip()
-    df = df.loc[:, ~df.columns.duplicated()]
-
-    # Convert numeric columns
-    for col in EXPECTED_NUMERIC_COLS:
+        # Build typed Arrow columns directly instead of an object-dtype frame
+        arrays = []
+        for name, values in zip(col_positions, columns):
+            if name in EXPECTED_NUMERIC_COLS:
+                # Numbers arrive as numbers; blanks become nulls (filled with 0 below) and any
+                # text cells (e.g. "1,200 kg") are parsed together in one batch
+                numbers = [v if isinstance(v, (int, float)) else None for v in values]
+                text_pos = [i for i, v in enumerate(values) if isinstance(v, str) and v.strip()]
+                if text_pos:
+                    parsed = parse_numeric_text([values[i] for i in text_pos])
+                    for i, x in zip(text_pos, parsed.tolist()):
+                        numbers[i] = x
+                arrays.append(pa.array(numbers + [None] * (n_rows - len(numbers)), type=pa.float64(), from_pandas=True))
+            elif name in EXPECTED_DATE_COLS:
+                # Date serials count days from 1899-12-30 (the Sheets epoch); blanks become NaT
+                # and only cells typed as plain text go through the date string parser.
+                # Serials are floored to whole days (dropping any time of day), matching the
+                # midnight dates the formatted date strings used to parse to.
+                serials = [v if isinstance(v, (int, float)) else np.nan for v in values]
+                dates = pd.to_datetime(
+                    np.floor(np.array(serials + [np.nan] * (n_rows - len(serials)), dtype=np.float64)),
+                    unit="D", origin="1899-12-30",
+                ).to_numpy(copy=True)
+                text_pos = [i for i, v in enumerate(values) if isinstance(v, str) and v.strip()]
+                if text_pos:
+                    dates[text_pos] = pd.to_datetime(pd.Series([values[i] for i in text_pos]), errors="coerce").to_numpy(dates.dtype)
+                arrays.append(pa.array(dates, from_pandas=True))
+            else:
+                values = values + [""] * (n_rows - len(values))
+                try:
+                    arrays.append(pa.array(values, type=pa.string()))
+                except pa.ArrowTypeError:
+                    # Unformatted values keep numeric IDs (e.g. ORD NO) as numbers
+                    arrays.append(pa.array([str(v) for v in values], type=pa.string()))
+        table = pa.Table.from_arrays(arrays, names=list(col_positions))
+        df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+    # Convert numeric columns. Sheet values and dummy data are already numbers, so only a
+    # non-numeric column pays for coercion; blanks become 0.
+    for col in df.columns.intersection(EXPECTED_NUMERIC_COLS):
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_numeric(values, errors="coerce")
+        df[col] = values.fillna(0).astype(np.float64)
+            
+    # Normalize remarks once (blank -> NaN) so their categories are exactly the real reasons
+    if "LATE DELIVERY REASON" in df.columns:
+        df["LATE DELIVERY REASON"] = df["LATE DELIVERY REASON"].astype(str).str.strip().replace('', np.nan)
+    
+    # ORD NO is a unique ID: Arrow-backed strings (one contiguous buffer) make the per-reason
+    # order slices cheap and let st.dataframe skip the object -> Arrow conversion
+    if "ORD NO" in df.columns:
+        df["ORD NO"] = df["ORD NO"].astype("string[pyarrow]")
+    
+    # Repeated labels as categoricals: sorted categories, integer codes for groupby
+    for col in ["CONT.PERSON", "LATE DELIVERY REASON", "ITEM NAME", "PURITY"]:
         if col in df.columns:
-            # Attempt to clean up strings (like removing currency symbols or spaces) before conversion
-            df[col] = df[col].astype(str).str.replace(r'[^\d\.\-]', '', regex=True)
-            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+            df[col] = df[col].astype("category")
             
     # Convert date columns
     for col in EXPECTED_DATE_COLS:
         if col in df.columns:
-            # errors="coerce" turns invalid dates/blanks into NaT
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+            # Sheet dates are already datetimes (from serial numbers). Strings (the dummy data)
+            # are ISO dates, parsed on the fast ISO8601 path; errors="coerce" turns invalid
+            # dates/blanks into NaT
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col], format="ISO8601", errors="coerce")
         else:
             st.warning(f"Required date column '{col}' was not found in the sheet.")
+    
+    # Keep rows sorted by order date (NaT last) so the order date slicer is a binary search
+    if "ODR DATE" in df.columns:
+        df = df.sort_values("ODR DATE", kind="stable", na_position="last", ignore_index=True)
             
     
     # --- POST-PROCESSING CHECK AND CALCULATIONS ---
     if all(col in df.columns for col in EXPECTED_NUMERIC_COLS):
-        # 1. Pending ORD = Total ORD WT - ON_TIME DEL - LATE_DEL
-        df['PENDING ORD'] = df['ORD WT'] - df['ON_TIME DEL'] - df['LATE_DEL']
-        # Ensure pending order weight is not negative
-        df['PENDING ORD'] = np.where(df['PENDING ORD'] < 0, 0, df['PENDING ORD'])
-        
-        # 2. Late Delivery % Calculation
-        df['LATE_DEL_%'] = np.where(
-            df['ORD WT'] > 0, 
-            (df['LATE_DEL'] / df['ORD WT']) * 100, 
-            0.0
-        )
+        # 1. Pending ORD = Total ORD WT - ON_TIME DEL - LATE_DEL, floored at 0
+        # 2. Late Delivery % = LATE_DEL / ORD WT * 100 (0 when there is no order weight)
+        # Both are written into preallocated arrays, without per-operator temporaries
+        ord_wt = df['ORD WT'].to_numpy()
+        on_time = df['ON_TIME DEL'].to_numpy()
+        late = df['LATE_DEL'].to_numpy()
+        pending = np.empty_like(ord_wt)
+        late_pct = np.zeros_like(ord_wt)
+        np.subtract(ord_wt, on_time, out=pending)
+        np.subtract(pending, late, out=pending)
+        np.maximum(pending, 0, out=pending)
+        np.divide(late, ord_wt, out=late_pct, where=ord_wt > 0)
+        np.multiply(late_pct, 100, out=late_pct)
+        df['PENDING ORD'] = pending
+        df['LATE_DEL_%'] = late_pct
     else:
         missing_cols = [col for col in EXPECTED_NUMERIC_COLS if col not in df.columns]
         if missing_cols:
@@ -119,16 +387,215 @@ def load_data():
 
     # 3. Lead Time Calculation (DUE DATE - ODR DATE)
     if all(col in df.columns for col in ["DUE DATE", "ODR DATE"]):
-        df['LEAD TIME (DAYS)'] = (df["DUE DATE"] - df["ODR DATE"]).dt.days
+        lead_days = (df["DUE DATE"] - df["ODR DATE"]).dt.days
+        # Whole days fit in a nullable Int16 (missing dates -> <NA>) unless a mistyped year
+        # pushes a lead time past ~89 years
+        lead_dtype = "Int16" if lead_days.abs().max() <= np.iinfo(np.int16).max else "Int32"
+        df['LEAD TIME (DAYS)'] = lead_days.astype(lead_dtype)
         
     else:
         st.warning("Cannot calculate 'LEAD TIME (DAYS)': Missing 'ODR DATE' or 'DUE DATE'.")
         # Ensure the column exists and is filled with NaN if calculation fails
         df['LEAD TIME (DAYS)'] = np.nan 
 
+    df.attrs["revision"] = revision
+
+    if cache_path is not None:
+        # Best effort: the dashboard still works if the cache dir is not writable.
+        # Uncompressed Feather is plain Arrow IPC, so a warm start reads it without decoding.
+        try:
+            DISK_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            os.chmod(DISK_CACHE_DIR, 0o700) # mkdir leaves an existing directory's mode as is
+            df.reset_index(drop=True).to_feather(cache_path, compression="uncompressed")
+            cached = sorted(DISK_CACHE_DIR.glob("*.feather"), key=lambda f: f.stat().st_mtime, reverse=True)
+            for stale in cached[DISK_CACHE_MAX_FILES:]:
+                stale.unlink()
+        except OSError:
+            pass
+
+    return df
+
+
+# ---------------------------------------------------------
+# CACHED FILTER AND AGGREGATE
+# ---------------------------------------------------------
+# cache_resource hands back the same objects without copying them; callers must not mutate them.
+# The frames are passed as underscore (unhashed) arguments and keyed by filter_key instead:
+# (data revision, order date range, due date range).
+@st.cache_resource(max_entries=16)
+def filter_orders(_df_full, filter_key):
+    """Returns the rows of `_df_full` inside the order/due date ranges of `filter_key`."""
+    _, ord_filter, due_filter = filter_key
+    df = _df_full
+    if ord_filter is not None:
+        start_ord_date, end_ord_date = ord_filter
+        # load_data() sorts by ODR DATE with NaT last (and NaT sorts after every date),
+        # so the range is one contiguous slice found by binary search. The order is checked
+        # (valid dates increasing, then only NaT) rather than assumed; otherwise a mask is used.
+        n_dates = df["ODR DATE"].count()
+        if df["ODR DATE"].iloc[:n_dates].is_monotonic_increasing:
+            ord_dates = df["ODR DATE"].to_numpy()
+            lo, hi = ord_dates.searchsorted([np.datetime64(start_ord_date), np.datetime64(end_ord_date)])
+            df = df.iloc[lo:hi]
+        else:
+            df = df[
+                (df["ODR DATE"].notna()) & 
+                (df["ODR DATE"] >= start_ord_date) & 
+                (df["ODR DATE"] < end_ord_date)
+            ]
+    if due_filter is not None:
+        start_due_date, end_due_date = due_filter
+        df = df[
+            (df["DUE DATE"].notna()) & 
+            (df["DUE DATE"] >= start_due_date) & 
+            (df["DUE DATE"] < end_due_date)
+        ]
     return df
 
 
+@st.cache_resource(max_entries=16)
+def aggregate_orders(_df, filter_key, agg_keys):
+    """Sums ORD WT / ON_TIME DEL / LATE_DEL / PENDING ORD and counts rows per `agg_keys` group of `_df`.
+
+    Returns a frame indexed by the (sorted) group keys with ord_wt, on_time, late, pending and
+    count. Rows with blank keys are kept, so the column sums are the totals of `_df`.
+    """
+    # dropna=False keeps rows with a blank reason/item in the person totals.
+    agg_gb = _df[["ORD WT", "ON_TIME DEL", "LATE_DEL", "PENDING ORD"]].groupby(
+        [_df[k] for k in agg_keys], sort=True, observed=True, dropna=False
+    )
+    agg = agg_gb.sum()
+    agg.columns = ["ord_wt", "on_time", "late", "pending"]
+    agg["count"] = agg_gb.size()
+    return agg
+
+
+# ---------------------------------------------------------
+# CACHED CHART FIGURES
+# ---------------------------------------------------------
+@st.cache_data(max_entries=16) # Same aggregate on a rerun -> reuse both figures instead of rebuilding them
+def make_agg_figures(agg, remark_col, item_col):
+    """Builds the remark count bar and item weight pie from the fused aggregate in one call.
+
+    `agg` is the aggregate with its group keys reset to columns (a flat frame hashes cleanly).
+
+    Returns a (remark_fig, item_fig) pair of Plotly figure dicts. remark_fig is None when the
+    reason column is missing or has no non-blank reasons; item_fig is None when the item
+    column is missing.
+    """
+    remark_fig = None
+    if remark_col in agg.columns:
+        # Blank (NaN) reasons are dropped by the groupby
+        remark_counts = agg.groupby(remark_col, observed=True)["count"].sum()
+        remark_counts = remark_counts.sort_values(ascending=False, kind="stable").reset_index()
+        remark_counts.columns = [remark_col, "COUNT"]
+        if not remark_counts.empty:
+            remark_fig = px.bar(
+                remark_counts,
+                x=remark_col,
+                y="COUNT",
+                title="Late Delivery Remarks Count (Excluding Blanks)",
+                color="COUNT",
+                color_continuous_scale=px.colors.sequential.Sunset,
+            ).to_dict()
+
+    item_fig = None
+    if item_col in agg.columns:
+        item_wt = agg.groupby(item_col, observed=True)["ord_wt"].sum().reset_index()
+        item_wt.columns = [item_col, "ORD WT"]
+
+        # Create pie chart
+        fig_item_pie = px.pie(
+            item_wt,
+            names=item_col,
+            values="ORD WT",
+            title="Item Name by Total Order Weight",
+            hole=.3,
+        )
+
+        # FIX: Enforce fixed size and control the domain of the pie chart itself
+        fig_item_pie.update_traces(
+            # Use a large domain to make the pie chart big within the available space
+            marker={'colors': px.colors.sequential.Plotly3}, # Ensure colors are assigned to traces
+            domain={'x': [0.0, 0.7], 'y': [0.1, 1.0]} # Pie takes 0% to 70% of horizontal space
+        )
+        
+        fig_item_pie.update_layout(**ITEM_PIE_LAYOUT)
+        item_fig = fig_item_pie.to_dict()
+
+    return remark_fig, item_fig
+
+@st.cache_data(max_entries=16) # Same filter_key on a rerun -> reuse the purity/lead-time figures without touching the rows
+def make_detail_figures(_df, filter_key, item_col, purity_col, lead_time_col):
+    """Builds the purity weight pie and the item lead-time bar from the filtered rows.
+
+    `_df` is not hashed: `filter_key` (the same key as filter_orders) identifies its rows.
+    Each source column is grouped exactly once.
+
+    Returns (purity_fig, lead_time_fig, delivery_time_summary); purity_fig is None when the
+    purity column is missing, the other two are None when the item or lead time column is.
+    """
+    purity_fig = None
+    if purity_col in _df.columns:
+        purity_wt = _df.groupby(purity_col, observed=True)["ORD WT"].sum().reset_index()
+
+        fig_purity_pie = px.pie(
+            purity_wt,
+            names=purity_col,
+            values="ORD WT",
+            title="Purity Distribution by Total Order Weight",
+            hole=.3,
+        )
+        # FIX: Enforce fixed size and control the domain of the pie chart itself
+        fig_purity_pie.update_traces(
+            marker={'colors': px.colors.sequential.Plotly3}, # Ensure colors are assigned to traces
+            domain={'x': [0.0, 0.9], 'y': [0.1, 1.0]} # Pie takes 0% to 90% of horizontal space (more compact legend)
+        )
+        
+        fig_purity_pie.update_layout(**PURITY_PIE_LAYOUT)
+        purity_fig = fig_purity_pie.to_dict()
+
+    lead_time_fig = None
+    delivery_time_summary = None
+    if item_col in _df.columns and lead_time_col in _df.columns:
+        # Group by ITEM NAME and calculate min, max, average lead time
+        delivery_time_summary = _df.groupby(item_col, observed=True)[lead_time_col].agg(
+            min_lead='min',
+            max_lead='max',
+            avg_lead='mean'
+        ).astype("float64").reset_index() # Nullable Int16 stats -> plain floats (<NA> -> NaN) for Plotly
+        
+        # Sort data by highest average lead time (Descending)
+        delivery_time_summary = delivery_time_summary.sort_values(by='avg_lead', ascending=False)
+        
+        # Long format for Plotly Express, built directly: the items repeat once per metric and
+        # the three metric columns are stacked in the same order
+        items = delivery_time_summary[item_col].to_numpy()
+        df_melted = pd.DataFrame({
+            item_col: np.tile(items, 3),
+            'Metric': np.repeat(['Min Lead Time', 'Max Lead Time', 'Avg Lead Time'], len(items)),
+            'Delivery Time (Days)': np.concatenate([
+                delivery_time_summary['min_lead'].to_numpy(),
+                delivery_time_summary['max_lead'].to_numpy(),
+                delivery_time_summary['avg_lead'].to_numpy(),
+            ]),
+        })
+        
+        # Create the bar chart
+        lead_time_fig = px.bar(
+            df_melted,
+            x=item_col,
+            y='Delivery Time (Days)',
+            color='Metric',
+            barmode='group',
+            title='Item Wise Min, Max, and Average Lead Time (DUE DATE - ODR DATE)',
+            color_discrete_map=LEAD_TIME_COLORS,
+            category_orders={item_col: delivery_time_summary[item_col].tolist()} 
+        ).to_dict()
+
+    return purity_fig, lead_time_fig, delivery_time_summary
+
+
 # ---------------------------------------------------------
 # AUTHENTICATION FUNCTION
 # ---------------------------------------------------------
@@ -190,10 +657,17 @@ else:
 
     # Add a sidebar refresh button
     if st.sidebar.button("🔄 Refresh Data"):
+        # Formula results (IMPORTRANGE, TODAY(), ...) can change without a new sheet revision,
+        # so a refresh drops the revision-keyed caches too and refetches the sheet
+        clear_disk_cache()
         st.cache_data.clear()
-        st.experimental_rerun()
+        filter_orders.clear()
+        aggregate_orders.clear()
+        st.rerun()
 
-    df_filtered = df_full.copy()
+    # (start, end) timestamps of each date filter (end exclusive), or None when not applied
+    ord_filter = None
+    due_filter = None
 
     st.markdown("### 📅 Date Filters")
 
@@ -201,16 +675,19 @@ else:
     if not DATE_COLS_LOADED:
         st.info("No valid date columns (ODR DATE, DUE DATE) were found in your spreadsheet. Date filters are disabled.")
     else:
-        # Safely determine min/max date, handling NaT values
-        all_valid_dates = pd.concat([df_full[col].dropna() for col in DATE_COLS_LOADED if col in df_full.columns])
+        # Safely determine min/max date, handling NaT values. Each column is reduced once
+        # (min/max skip NaT) and the slicers below reuse these bounds.
+        date_bounds = {col: (df_full[col].min(), df_full[col].max()) for col in DATE_COLS_LOADED}
+        valid_mins = [lo for lo, _ in date_bounds.values() if pd.notna(lo)]
+        valid_maxs = [hi for _, hi in date_bounds.values() if pd.notna(hi)]
         
-        if all_valid_dates.empty:
+        if not valid_mins:
             min_date = datetime.today().date() - timedelta(days=365)
             max_date = datetime.today().date()
             st.info("No valid date entries found in the loaded date columns. Using a default filter range (last 1 year).")
         else:
-            min_date = all_valid_dates.min().date()
-            max_date = all_valid_dates.max().date()
+            min_date = min(valid_mins).date()
+            max_date = max(valid_maxs).date()
             
         filter_col1, filter_col2 = st.columns(2)
 
@@ -219,8 +696,7 @@ else:
             with filter_col1:
                 st.markdown("##### Filter by Order Date")
                 
-                ord_date_min_valid = df_full["ODR DATE"].min()
-                ord_date_max_valid = df_full["ODR DATE"].max()
+                ord_date_min_valid, ord_date_max_valid = date_bounds["ODR DATE"]
                 
                 default_start_ord = min_date
                 default_end_ord = max_date
@@ -245,19 +721,14 @@ else:
                 if len(ord_date_range) == 2:
                     start_ord_date = pd.to_datetime(ord_date_range[0])
                     end_ord_date = pd.to_datetime(ord_date_range[1]) + timedelta(days=1)
-                    df_filtered = df_filtered[
-                        (df_filtered["ODR DATE"].notna()) & 
-                        (df_filtered["ODR DATE"] >= start_ord_date) & 
-                        (df_filtered["ODR DATE"] < end_ord_date)
-                    ]
+                    ord_filter = (start_ord_date, end_ord_date)
 
         # --- Slicer 2: Due Date Range ---
         if "DUE DATE" in DATE_COLS_LOADED:
             with filter_col2:
                 st.markdown("##### Filter by Due Date")
                 
-                due_date_min_valid = df_full["DUE DATE"].min()
-                due_date_max_valid = df_full["DUE DATE"].max()
+                due_date_min_valid, due_date_max_valid = date_bounds["DUE DATE"]
                 
                 default_start_due = min_date
                 default_end_due = max_date
@@ -282,13 +753,12 @@ else:
                 if len(due_date_range) == 2:
                     start_due_date = pd.to_datetime(due_date_range[0])
                     end_due_date = pd.to_datetime(due_date_range[1]) + timedelta(days=1)
-                    df_filtered = df_filtered[
-                        (df_filtered["DUE DATE"].notna()) & 
-                        (df_filtered["DUE DATE"] >= start_due_date) & 
-                        (df_filtered["DUE DATE"] < end_due_date)
-                    ]
+                    due_filter = (start_due_date, end_due_date)
 
-    df = df_filtered.copy()
+    # Same data revision and ranges -> same rows and aggregate, so a rerun triggered by any
+    # other widget (e.g. a drilldown toggle) reuses them instead of re-filtering
+    filter_key = (df_full.attrs.get("revision"), ord_filter, due_filter)
+    df = filter_orders(df_full, filter_key)
 
 
     # ---------------------------------------------------------
@@ -299,261 +769,164 @@ else:
 
     PERSON_COL = "CONT.PERSON"
     REMARK_COL = "LATE DELIVERY REASON"
+    ITEM_COL = "ITEM NAME"
 
     # Check if all required columns exist after data loading and calculation attempt
     if not all(col in df.columns for col in REQUIRED_MATRIX_COLS):
         st.error("Required calculation columns are missing. Cannot render matrix. Please check the data loading step and column names in your Google Sheet.")
         st.stop()
     else:
-        # --- CSS for Professional Table Styling (Kept as is for structure) ---
-        st.markdown("""
-            <style>
-            /* General styling for the matrix container */
-            .matrix-container {
-                border: 1px solid #333333;
-                border-radius: 8px;
-                margin-bottom: 20px;
-                overflow: hidden; 
-            }
-
-            /* Styling for the header row */
-            .matrix-header {
-                background-color: #383838; 
-                padding: 8px 5px; 
-                font-weight: 700;
-                color: #f0f2f6; 
-                border-bottom: 2px solid #555555;
-                text-transform: uppercase;
-                font-size: 0.75em; 
-                white-space: nowrap;
-                overflow: hidden;
-                text-overflow: ellipsis;
-                text-align: center; 
-            }
-            .matrix-header.person-header {
-                  text-align: left; 
-            }
-
-            /* Styling for the data rows (Person Summary) */
-            .person-summary-row {
-                padding: 2px 5px; 
-                border-bottom: 1px solid #222222; 
-                align-items: center;
-                display: flex; 
-                font-size: 0.8em; 
-                min-height: 25px; 
-            }
-            
-            /* INCREASE FONT SIZE FOR VALUE COLUMNS */
-            .summary-value-cell {
-                font-size: 1.1em !important; 
-                display: flex; 
-                align-items: center;
-                justify-content: flex-end; 
-                min-height: 35px; 
-                padding-top: 5px; 
-                padding-bottom: 5px;
-            }
-
-            /* Grand Total Row Styling */
-            .grand-total-row {
-                background-color: #1e1e1e; 
-                font-weight: 800;
-                color: #ffffff; 
-                border-top: 2px solid #555555;
-                font-size: 0.85em;
-            }
-
-            /* Color Coding for Metric Values */
-            .on-time-del { color: #5cb85c; font-weight: 600; }
-            .late-del { color: #d9534f; font-weight: 600; }
-            .ord-wt { color: #6a9ce7; }
-            .pending-ord { color: #f0ad4e; font-weight: 600; }
-            .late-del-percent { color: #fa5788; font-weight: 600; }
-
-            /* Icon Styling */
-            [data-testid="stExpander"] button p { display: none !important; }
-            [data-testid="stExpander"] button:before { content: '➕'; font-size: 1.5em; color: #6a9ce7; transition: transform 0.3s; margin: 0; padding: 0; line-height: 1; }
-            [data-testid="stExpander"] button[aria-expanded="true"]:before { content: '➖'; color: #d9534f; }
-            .stColumns { margin-top: 0px !important; margin-bottom: 0px !important; padding-top: 0px !important; padding-bottom: 0px !important; position: relative; }
-            .person-name-cell { padding-left: 5px !important; }
-            
-            /* Toggle icon styling for visibility */
-            /* Hides the default Streamlit toggle label and checkbox */
-            [data-testid^="stForm"] + div > div > div:nth-child(1) [data-testid="stForm"] + div label { visibility: hidden; height: 0; margin: 0; padding: 0; }
-            [data-testid^="stForm"] + div > div > div:nth-child(1) [data-testid="stForm"] + div input[type="checkbox"] { display: none; }
-            
-            /* Custom plus icon for toggle */
-            [data-testid^="stForm"] + div > div > div:nth-child(1) [data-testid="stForm"] + div label:before {
-                visibility: visible; 
-                content: '➕'; 
-                font-size: 1.5em; 
-                color: #6a9ce7; 
-                position: absolute; 
-                top: 50%; 
-                left: 50%; 
-                transform: translate(-50%, -50%); 
-                margin: 0; 
-                cursor: pointer;
-            }
-            /* Custom minus icon for toggle when checked */
-            [data-testid^="stForm"] + div > div > div:nth-child(1) [data-testid="stForm"] + div input[type="checkbox"]:checked + label:before {
-                content: '➖'; 
-                color: #d9534f;
-            }
-            </style>
-        """, unsafe_allow_html=True)
-
-        # Get unique persons from filtered data
-        persons = sorted(df[PERSON_COL].dropna().unique())
-
-        st.markdown('<div class="matrix-container">', unsafe_allow_html=True)
-        
-        # --- Matrix Header Row ---
-        cols_header = st.columns([0.3, 2.2, 1, 1, 1, 1, 1])
-        
-        cols_header[0].markdown('<div class="matrix-header" style="text-align: center;"></div>', unsafe_allow_html=True)
-        cols_header[1].markdown('<div class="matrix-header person-header">CONT.PERSON</div>', unsafe_allow_html=True)
-        cols_header[2].markdown('<div class="matrix-header">ORD WT</div>', unsafe_allow_html=True)
-        cols_header[3].markdown('<div class="matrix-header">ON_TIME DEL</div>', unsafe_allow_html=True)
-        cols_header[4].markdown('<div class="matrix-header">LATE_DEL</div>', unsafe_allow_html=True)
-        cols_header[5].markdown('<div class="matrix-header">PENDING ORD</div>', unsafe_allow_html=True)
-        cols_header[6].markdown('<div class="matrix-header">LATE_DEL %</div>', unsafe_allow_html=True)
+        # --- CSS for Professional Table Styling (rendered on every rerun: Streamlit drops
+        # elements that a rerun does not emit again) ---
+        st.markdown(MATRIX_CSS, unsafe_allow_html=True)
+
+        # One fused pass over the filtered rows; the matrix and the charts below derive from it
+        agg_keys = tuple(col for col in (PERSON_COL, REMARK_COL, ITEM_COL) if col in df.columns)
+        agg = aggregate_orders(df, filter_key, agg_keys)
+        # Person is the outer (sorted) key, so each person's rows in agg are contiguous and a
+        # single segmented np.add.reduceat sums all three columns for every person at once.
+        # (observed=True keeps only persons present after the date filters, in category order)
+        agg_persons = agg[agg.index.get_level_values(PERSON_COL).notna()]
+        person_index = agg_persons.index.get_level_values(PERSON_COL)
+        _, starts = np.unique(person_index.codes, return_index=True)
+        person_totals = pd.DataFrame(
+            np.add.reduceat(agg_persons[["ord_wt", "on_time", "late"]].to_numpy(), starts, axis=0, dtype=np.float64),
+            index=person_index[starts],
+            columns=["ord_wt", "on_time", "late"],
+        )
+        # Derived per-person columns, computed once for all persons instead of inside the row loop
+        ord_wt = person_totals["ord_wt"].to_numpy()
+        person_totals["pending"] = np.maximum(0.0, ord_wt - person_totals["on_time"].to_numpy() - person_totals["late"].to_numpy())
+        person_totals["late_pct"] = np.where(ord_wt > 0, person_totals["late"].to_numpy() / np.where(ord_wt > 0, ord_wt, 1.0) * 100.0, 0.0)
+
+        # Drilldown index, built lazily by the first expanded person (collapsed reruns skip the
+        # pass): rows partitioned by (person, reason) into {(p, r): row positions}, blank
+        # reasons are NaN and dropped. Drilldowns gather rows with df.take, no masks.
+        remark_rows = None
+        person_remarks = {}
+        # Positions of the order detail columns, resolved once for every reason table
+        order_detail_cols = ["ORD NO", "ORD WT", "ON_TIME DEL", "LATE_DEL", "PENDING ORD"]
+        detail_positions = [df.columns.get_loc(col) for col in order_detail_cols if col in df.columns]
+
+        # --- Grand Total Row ---
+        # From the cached (float64) aggregate: it keeps blank-key groups, so its column sums
+        # are the totals of the filtered rows and a rerun does not rescan them
+        total_ord_wt, total_ontime_del, total_late_del, total_pending_ord = (
+            agg[["ord_wt", "on_time", "late", "pending"]].to_numpy().sum(axis=0)
+        )
         
-        # --- Data Rows (Person Summary) ---
-        for p in persons:
-            df_p = df[df[PERSON_COL] == p].dropna(subset=[PERSON_COL])
+        total_late_del_percent = (total_late_del / total_ord_wt) * 100 if total_ord_wt > 0 else 0.0
 
-            if df_p.empty:
-                continue
-                
-            ord_wt_sum = df_p["ORD WT"].sum()
-            ontime_del_sum = df_p["ON_TIME DEL"].sum()
-            late_del_sum = df_p["LATE_DEL"].sum()
-            
-            pending_ord_sum = max(0, ord_wt_sum - ontime_del_sum - late_del_sum) 
-            late_del_percent_agg = (late_del_sum / ord_wt_sum) * 100 if ord_wt_sum > 0 else 0.0
+        # --- Summary Matrix ---
+        # Header, person rows and grand total are one HTML table sent in a single st.markdown
+        # call (instead of 7 columns + 7 markdown elements per row)
+        header_html = (
+            '<thead><tr>'
+            '<th class="matrix-header person-header">CONT.PERSON</th>'
+            '<th class="matrix-header">ORD WT</th>'
+            '<th class="matrix-header">ON_TIME DEL</th>'
+            '<th class="matrix-header">LATE_DEL</th>'
+            '<th class="matrix-header">PENDING ORD</th>'
+            '<th class="matrix-header">LATE_DEL %</th>'
+            '</tr></thead>'
+        )
+        rows_html = "".join(
+            f'<tr class="person-summary-row">'
+            f'<td class="person-name-cell">👤 {html.escape(str(p))}</td>'
+            f'<td class="summary-value-cell ord-wt">{t.ord_wt:,.2f}</td>'
+            f'<td class="summary-value-cell on-time-del">{t.on_time:,.2f}</td>'
+            f'<td class="summary-value-cell late-del">{t.late:,.2f}</td>'
+            f'<td class="summary-value-cell pending-ord">{t.pending:,.2f}</td>'
+            f'<td class="summary-value-cell late-del-percent">{t.late_pct:,.2f}%</td>'
+            f'</tr>'
+            for p, t in zip(person_totals.index, person_totals.itertuples(index=False))
+        )
+        total_html = (
+            f'<tr class="person-summary-row grand-total-row">'
+            f'<td class="person-name-cell">GRAND TOTAL</td>'
+            f'<td class="summary-value-cell ord-wt">{total_ord_wt:,.2f}</td>'
+            f'<td class="summary-value-cell on-time-del">{total_ontime_del:,.2f}</td>'
+            f'<td class="summary-value-cell late-del">{total_late_del:,.2f}</td>'
+            f'<td class="summary-value-cell pending-ord">{total_pending_ord:,.2f}</td>'
+            f'<td class="summary-value-cell late-del-percent">{total_late_del_percent:,.2f}%</td>'
+            f'</tr>'
+        )
+        st.markdown(
+            f'<div class="matrix-container"><table class="matrix-table">'
+            f'{header_html}<tbody>{rows_html}</tbody><tfoot>{total_html}</tfoot>'
+            f'</table></div>',
+            unsafe_allow_html=True,
+        )
 
+        # --- Drilldown (Remarks Section) ---
+        # One toggle per person below the table; only the expanded person's subtree is built
+        # and reasons are gated by their own toggles
+        st.markdown("##### 🔍 Person Drilldown")
+        for p in person_totals.index:
             expander_key = f'expander_{p}'
+            is_expanded = st.toggle(
+                label=f"👤 {p}", 
+                value=st.session_state.get(expander_key, False), 
+                key=f'toggle_{expander_key}'
+            )
+            st.session_state[expander_key] = is_expanded
 
-            # 1. Display the static summary row (always visible)
-            cols_summary = st.columns([0.3, 2.2, 1, 1, 1, 1, 1])
-            
-            # Col 0: Expander Icon (➕)
-            with cols_summary[0]:
-                is_expanded = st.toggle(
-                    label=" ", 
-                    value=st.session_state.get(expander_key, False), 
-                    key=f'toggle_{expander_key}'
-                )
-                st.session_state[expander_key] = is_expanded
-            
-            # Col 1: Person Name 
-            cols_summary[1].markdown(f'<div class="person-summary-row person-name-cell">👤 {p}</div>', unsafe_allow_html=True)
-            
-            # Format numbers
-            ord_wt_str = f"{ord_wt_sum:,.2f}"
-            ontime_del_str = f"{ontime_del_sum:,.2f}"
-            late_del_str = f"{late_del_sum:,.2f}"
-            pending_ord_str = f"{pending_ord_sum:,.2f}"
-            late_del_percent_str = f"{late_del_percent_agg:,.2f}%"
-
-            # Summary Values (Cols 2, 3, 4, 5, 6)
-            cols_summary[2].markdown(f'<div class="person-summary-row summary-value-cell ord-wt">{ord_wt_str}</div>', unsafe_allow_html=True)
-            cols_summary[3].markdown(f'<div class="person-summary-row summary-value-cell on-time-del">{ontime_del_str}</div>', unsafe_allow_html=True)
-            cols_summary[4].markdown(f'<div class="person-summary-row summary-value-cell late-del">{late_del_str}</div>', unsafe_allow_html=True)
-            cols_summary[5].markdown(f'<div class="person-summary-row summary-value-cell pending-ord">{pending_ord_str}</div>', unsafe_allow_html=True)
-            cols_summary[6].markdown(f'<div class="person-summary-row summary-value-cell late-del-percent">{late_del_percent_str}</div>', unsafe_allow_html=True)
-
-
-            # --- Drilldown Detail (Remarks Section) ---
-            if st.session_state.get(expander_key, False):
+            if is_expanded:
                 with st.container(border=True): 
                     st.markdown(f"**Details for {p}**", unsafe_allow_html=True)
                     
-                    if REMARK_COL in df_p.columns:
-                        # Filter remarks to drop blanks/NaN
-                        remarks = sorted(df_p[REMARK_COL].astype(str).str.strip().replace('', np.nan).dropna().unique())
+                    if REMARK_COL in df.columns:
+                        if remark_rows is None:
+                            remark_rows = df.groupby([PERSON_COL, REMARK_COL], sort=True, observed=True).indices
+                            for person, keys in itertools.groupby(sorted(remark_rows), key=lambda k: k[0]):
+                                person_remarks[person] = [r for _, r in keys]
+                        # Remarks were normalized in load_data() and come sorted from the groupby
+                        remarks = person_remarks.get(p, [])
 
                         if remarks:
                             st.markdown("##### 📝 Late Delivery Details by Reason")
 
                             for r in remarks:
-                                with st.expander(f"➡️ **Reason:** {r}"):
-                                    df_r = df_p[df_p[REMARK_COL] == r]
-
-                                    try:
-                                        order_detail_cols = ["ORD NO", "ORD WT", "ON_TIME DEL", "LATE_DEL", "PENDING ORD"]
-                                        existing_cols = [col for col in order_detail_cols if col in df_r.columns]
-                                        
-                                        if existing_cols:
-                                            orders = df_r[existing_cols].copy()
-                                            st.markdown(f"###### 📦 Orders affected by '{r}' ({len(orders)} orders)")
-                                            st.dataframe(orders, use_container_width=True, hide_index=True, height=200) 
-                                        else:
-                                            st.info("Required order detail columns (ORD NO, ORD WT, etc.) are missing.")
-                                    except KeyError as e:
-                                        st.error(f"Missing column in detail view: {e}")
+                                # st.expander always renders its body; a toggle lets collapsed
+                                # reasons skip the orders slice and its Arrow serialization
+                                if st.toggle(f"➡️ **Reason:** {r}", key=f"toggle_reason_{p}_{r}"):
+                                    if detail_positions:
+                                        # Gather just this reason's rows of the detail columns
+                                        orders = df.iloc[remark_rows[(p, r)], detail_positions]
+                                        st.markdown(f"###### 📦 Orders affected by '{r}' ({len(orders)} orders)")
+                                        st.dataframe(orders, use_container_width=True, hide_index=True, height=200) 
+                                    else:
+                                        st.info("Required order detail columns (ORD NO, ORD WT, etc.) are missing.")
                         else:
                             st.info("No specific late delivery remarks recorded for this person in the filtered data.")
                     else:
                         st.error(f"Column '{REMARK_COL}' not found! Cannot display remark details.")
 
-        # --- Grand Total Row ---
-        total_ord_wt = df["ORD WT"].sum()
-        total_ontime_del = df["ON_TIME DEL"].sum()
-        total_late_del = df["LATE_DEL"].sum()
-        total_pending_ord = df["PENDING ORD"].sum()
-        
-        total_late_del_percent = (total_late_del / total_ord_wt) * 100 if total_ord_wt > 0 else 0.0
-        
-        # Format totals
-        total_ord_wt_str = f"{total_ord_wt:,.2f}"
-        total_ontime_del_str = f"{total_ontime_del:,.2f}"
-        total_late_del_str = f"{total_late_del:,.2f}"
-        total_pending_ord_str = f"{total_pending_ord:,.2f}"
-        total_late_del_percent_str = f"{total_late_del_percent:,.2f}%"
-
-        cols_total = st.columns([0.3, 2.2, 1, 1, 1, 1, 1])
-        
-        cols_total[0].markdown('<div class="person-summary-row grand-total-row person-name-cell"></div>', unsafe_allow_html=True)
-        cols_total[1].markdown('<div class="person-summary-row grand-total-row person-name-cell">GRAND TOTAL</div>', unsafe_allow_html=True)
-        cols_total[2].markdown(f'<div class="person-summary-row grand-total-row summary-value-cell ord-wt">{total_ord_wt_str}</div>', unsafe_allow_html=True)
-        cols_total[3].markdown(f'<div class="person-summary-row grand-total-row summary-value-cell on-time-del">{total_ontime_del_str}</div>', unsafe_allow_html=True)
-        cols_total[4].markdown(f'<div class="person-summary-row grand-total-row summary-value-cell late-del">{total_late_del_str}</div>', unsafe_allow_html=True)
-        cols_total[5].markdown(f'<div class="person-summary-row grand-total-row summary-value-cell pending-ord">{total_pending_ord_str}</div>', unsafe_allow_html=True)
-        cols_total[6].markdown(f'<div class="person-summary-row grand-total-row summary-value-cell late-del-percent">{total_late_del_percent_str}</div>', unsafe_allow_html=True)
-
-        st.markdown('</div>', unsafe_allow_html=True)
         
     # ---------------------------------------------------------
     # CHARTS
     # ---------------------------------------------------------
     if not df.empty and all(col in df.columns for col in REQUIRED_MATRIX_COLS):
         st.write("### 📘 Raw Data Preview (Filtered)")
-        st.dataframe(df, use_container_width=True)
+        # Only the first page is serialized on each rerun unless the user asks for everything
+        if len(df) > RAW_PREVIEW_ROWS and not st.checkbox(f"Show all {len(df):,} rows", key="show_all_rows"):
+            st.caption(f"Showing the first {RAW_PREVIEW_ROWS} of {len(df):,} rows.")
+            st.dataframe(df.head(RAW_PREVIEW_ROWS), use_container_width=True)
+        else:
+            st.dataframe(df, use_container_width=True)
         
         st.write("---")
         
         ## 1. Remark Count Bar Chart (Excluding Blanks)
         st.write("## 📊 No of problems Count")
 
+        # Both figures derive from the fused aggregate and are built (and cached) together
+        remark_fig, item_fig = make_agg_figures(agg.reset_index(), REMARK_COL, ITEM_COL)
+
         REMARK_COL = "LATE DELIVERY REASON"
         if REMARK_COL in df.columns:
-            # Filter out blanks/empty strings
-            remark_counts = df[REMARK_COL].astype(str).str.strip().replace('', np.nan).dropna().value_counts().reset_index()
-            remark_counts.columns = [REMARK_COL, "COUNT"]
-
-            if not remark_counts.empty:
-                fig_bar = px.bar(
-                    remark_counts,
-                    x=REMARK_COL,
-                    y="COUNT",
-                    title="Late Delivery Remarks Count (Excluding Blanks)",
-                    color="COUNT",
-                    color_continuous_scale=px.colors.sequential.Sunset,
-                )
-                st.plotly_chart(fig_bar, use_container_width=True)
+            if remark_fig is not None:
+                st.plotly_chart(remark_fig, use_container_width=True)
             else:
                 st.info("No late delivery remarks found in the current date filter selection.")
         else:
@@ -562,8 +935,14 @@ else:
         st.write("---")
         
         ## 2 & 3. Pie Charts (Item Name and Purity)
-        ITEM_COL = "ITEM NAME"
         PURITY_COL = "PURITY"
+        LEAD_TIME_COL = 'LEAD TIME (DAYS)'
+
+        # The purity pie and the lead-time chart are built (and cached per filter_key)
+        # together; the item pie above already comes from the fused aggregate
+        purity_fig, lead_time_fig, delivery_time_summary = make_detail_figures(
+            df, filter_key, ITEM_COL, PURITY_COL, LEAD_TIME_COL
+        )
         
         st.write("## 🥧 Item Name & Purity Distribution by Order Weight")
         
@@ -572,82 +951,16 @@ else:
         # Pie Chart 1: Item Name vs Total Order Weight
         with col_pie1:
             if ITEM_COL in df.columns:
-                # Group data
-                item_wt = df.groupby(ITEM_COL)["ORD WT"].sum().reset_index()
-
-                # Create pie chart
-                fig_item_pie = px.pie(
-                    item_wt,
-                    names=ITEM_COL,
-                    values="ORD WT",
-                    title="Item Name by Total Order Weight",
-                    hole=.3,
-                )
-
-                # FIX: Enforce fixed size and control the domain of the pie chart itself
-                fig_item_pie.update_traces(
-                    # Use a large domain to make the pie chart big within the available space
-                    marker={'colors': px.colors.sequential.Plotly3}, # Ensure colors are assigned to traces
-                    domain={'x': [0.0, 0.7], 'y': [0.1, 1.0]} # Pie takes 0% to 70% of horizontal space
-                )
-                
-                fig_item_pie.update_layout(
-                    height=700, 
-                    width=500, # Enforce a specific width for better consistency
-                    title_x=0.05, # Align title to left to make space for pie
-                    uniformtext_minsize=12,
-                    uniformtext_mode='hide',
-                    # Legend placement to the right of the pie (0.75-1.0)
-                    legend=dict(
-                        orientation="v", 
-                        yanchor="top",
-                        y=1.0, 
-                        xanchor="left",
-                        x=0.75, 
-                        font=dict(size=9)
-                    )
-                )
-
-                # Show chart
-                st.plotly_chart(fig_item_pie, use_container_width=True)
+                # Show chart (built together with the remark chart above)
+                st.plotly_chart(item_fig, use_container_width=True)
 
             else:
                 st.info(f"Cannot generate Item Weight Pie Chart: Column '{ITEM_COL}' is missing.")
 
         # Pie Chart 2: Purity vs Total Order Weight
         with col_pie2:
-            if PURITY_COL in df.columns:
-                purity_wt = df.groupby(PURITY_COL)["ORD WT"].sum().reset_index()
-
-                fig_purity_pie = px.pie(
-                    purity_wt,
-                    names=PURITY_COL,
-                    values="ORD WT",
-                    title="Purity Distribution by Total Order Weight",
-                    hole=.3,
-                )
-                # FIX: Enforce fixed size and control the domain of the pie chart itself
-                fig_purity_pie.update_traces(
-                    marker={'colors': px.colors.sequential.Plotly3}, # Ensure colors are assigned to traces
-                    domain={'x': [0.0, 0.9], 'y': [0.1, 1.0]} # Pie takes 0% to 90% of horizontal space (more compact legend)
-                )
-                
-                fig_purity_pie.update_layout(
-                    height=700, 
-                    width=500, # Enforce a specific width for better consistency
-                    title_x=0.5, 
-                    uniformtext_minsize=12, 
-                    uniformtext_mode='hide',
-                    # Legend horizontal, below the chart
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=-0.05, 
-                        xanchor="center",
-                        x=0.5
-                    )
-                )
-                st.plotly_chart(fig_purity_pie, use_container_width=True)
+            if purity_fig is not None:
+                st.plotly_chart(purity_fig, use_container_width=True)
             else:
                 st.info(f"Cannot generate Purity Pie Chart: Column '{PURITY_COL}' is missing.")
 
@@ -656,50 +969,9 @@ else:
         
         ## 4. Item Wise Delivery Time (Min, Max, Avg)
         st.write("## ⏱️ Item Wise Production time Analysis")
-        LEAD_TIME_COL = 'LEAD TIME (DAYS)'
 
-        if ITEM_COL in df.columns and LEAD_TIME_COL in df.columns:
-            # Group by ITEM NAME and calculate min, max, average lead time
-            delivery_time_summary = df.groupby(ITEM_COL)[LEAD_TIME_COL].agg(
-                min_lead='min',
-                max_lead='max',
-                avg_lead='mean'
-            ).reset_index()
-            
-            # Sort data by highest average lead time (Descending)
-            delivery_time_summary = delivery_time_summary.sort_values(by='avg_lead', ascending=False)
-            
-            # Melt the dataframe for plotting with Plotly Express
-            df_melted = delivery_time_summary.melt(
-                id_vars=ITEM_COL,
-                value_vars=['min_lead', 'max_lead', 'avg_lead'],
-                var_name='Metric',
-                value_name='Delivery Time (Days)'
-            )
-            
-            df_melted['Metric'] = df_melted['Metric'].replace({
-                'min_lead': 'Min Lead Time',
-                'max_lead': 'Max Lead Time',
-                'avg_lead': 'Avg Lead Time'
-            })
-            
-            # Create the bar chart
-            fig_lead_time = px.bar(
-                df_melted,
-                x=ITEM_COL,
-                y='Delivery Time (Days)',
-                color='Metric',
-                barmode='group',
-                title='Item Wise Min, Max, and Average Lead Time (DUE DATE - ODR DATE)',
-                color_discrete_map={
-                    'Avg Lead Time': '#6a9ce7',
-                    'Max Lead Time': '#d9534f',
-                    'Min Lead Time': '#5cb85c',
-                },
-                category_orders={ITEM_COL: delivery_time_summary[ITEM_COL].tolist()} 
-            )
-            
-            st.plotly_chart(fig_lead_time, use_container_width=True)
+        if lead_time_fig is not None:
+            st.plotly_chart(lead_time_fig, use_container_width=True)
             
             st.markdown("##### Matrix Table (Sorted by Average Lead Time)")
             # Display the matrix table as requested, formatted to 2 decimal places and excluding the index